@@ -1,102 +1,285 @@
 import os
+import copy
+import math
+import queue
+import threading
 import cv2
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import matplotlib.pyplot as plt
 
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import torch.optim as optim
 from torch.utils.data import Dataset, DataLoader
 from sklearn.model_selection import train_test_split
 from torch.optim.lr_scheduler import ReduceLROnPlateau
-import torchvision.transforms as transforms
+from torchvision.transforms import v2
 import torchvision.models as models
 
 # ----------------------------------------
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 print("Using device:", device)
 
+# Input shape is fixed (64x64), so let cuDNN autotune and cache the fastest conv algorithms,
+# and route FP32 convs/matmuls through TF32 Tensor Cores
+torch.backends.cudnn.benchmark = True
+torch.backends.cudnn.allow_tf32 = True
+torch.backends.cuda.matmul.allow_tf32 = True
+torch.set_float32_matmul_precision('high')
+
+# Mixed precision (FP16 autocast + dynamic loss scaling) is only used on GPU
+use_amp = device.type == "cuda"
+
 # ----------------------------------------
 # Define Custom Dataset (stores images and labels)
+# Returns raw uint8 samples; augmentation and preprocessing run batched on the device
 class CustomImageDataset(Dataset):
-    def __init__(self, images, labels, transform=None):
+    def __init__(self, images, labels):
         """
-        images: numpy array, shape (N, H, W, 3), RGB, normalized values ([-1,1])
-        labels: numpy array, integer labels
-        transform: torchvision.transforms for image augmentation and preprocessing
+        images: uint8 tensor, shape (N, 3, H, W), RGB values ([0,255])
+        labels: int64 tensor, shape (N,)
         """
         self.images = images
         self.labels = labels
-        self.transform = transform
 
     def __len__(self):
         return len(self.images)
 
     def __getitem__(self, idx):
-        # Image: (H, W, 3), already normalized to [-1,1]
+        # Image: (3, H, W) uint8 tensor
         image = self.images[idx]
-        if self.transform:
-            # To apply transform, restore range from [-1,1] to [0,255] and convert to PIL image
-            image_uint8 = (((image + 1) * 127.5).clip(0, 255)).astype(np.uint8)
-            image = transforms.ToPILImage()(image_uint8)
-            image = self.transform(image)
-        else:
-            image = torch.from_numpy(image.transpose(2, 0, 1))
         label = int(self.labels[idx])
         return image, label
 
 # ----------------------------------------
-data = []
-labels = []
+# Per-channel normalization as the first layer of the network, so it runs on the GPU
+# as part of the model (and is fused with conv1 by torch.compile)
+class Normalize(nn.Module):
+    def __init__(self, mean, std):
+        super().__init__()
+        self.register_buffer('mean', torch.tensor(mean).view(1, 3, 1, 1))
+        self.register_buffer('inv_std', 1.0 / torch.tensor(std).view(1, 3, 1, 1))
+
+    def forward(self, x):
+        return (x - self.mean) * self.inv_std
+
+# ----------------------------------------
+# Batched geometric augmentation with per-sample random parameters, equivalent to
+# RandomRotation -> RandomAffine(translate) -> RandomResizedCrop applied to each image.
+# The three steps are composed into one affine matrix per sample, so the whole batch is
+# resampled with a single affine_grid + grid_sample (bilinear, zero fill outside the image)
+class RandomAffineAugment(nn.Module):
+    def __init__(self, degrees, translate, scale, ratio=(3 / 4, 4 / 3)):
+        """
+        degrees: rotation range (-degrees, +degrees)
+        translate: max (horizontal, vertical) shift as a fraction of the image size
+        scale: range of the crop area as a fraction of the image area
+        ratio: range of the crop aspect ratio (width / height)
+        """
+        super().__init__()
+        self.degrees = degrees
+        self.translate = translate
+        self.scale = scale
+        self.log_ratio = (math.log(ratio[0]), math.log(ratio[1]))
+
+    def forward(self, images):
+        batch = images.size(0)
+        dev = images.device
+
+        # Per-sample parameters (normalized coordinates: the image spans [-1,1]),
+        # drawn directly on the device from Python-float bounds (no host-to-device copies)
+        angle = torch.empty(batch, device=dev).uniform_(-self.degrees, self.degrees).deg2rad()
+        shift_x = torch.empty(batch, device=dev).uniform_(-2 * self.translate[0], 2 * self.translate[0])
+        shift_y = torch.empty(batch, device=dev).uniform_(-2 * self.translate[1], 2 * self.translate[1])
+        area = torch.empty(batch, device=dev).uniform_(*self.scale)
+        aspect = torch.empty(batch, device=dev).uniform_(*self.log_ratio).exp()
+        crop_w = (area * aspect).sqrt().clamp(max=1.0)
+        crop_h = (area / aspect).sqrt().clamp(max=1.0)
+        center_x = (torch.rand(batch, device=dev) * 2 - 1) * (1 - crop_w)
+        center_y = (torch.rand(batch, device=dev) * 2 - 1) * (1 - crop_h)
+
+        # Output -> input mapping: rotate_back(crop(output) - shift)
+        cos, sin = angle.cos(), angle.sin()
+        offset_x, offset_y = center_x - shift_x, center_y - shift_y
+        theta = torch.stack([
+            torch.stack([cos * crop_w, sin * crop_h, cos * offset_x + sin * offset_y], dim=1),
+            torch.stack([-sin * crop_w, cos * crop_h, -sin * offset_x + cos * offset_y], dim=1),
+        ], dim=1)
+        grid = F.affine_grid(theta, list(images.shape), align_corners=False)
+        return F.grid_sample(images, grid, mode='bilinear', padding_mode='zeros', align_corners=False)
+
+# ----------------------------------------
+# Wraps a DataLoader and copies the next batch to the GPU on a side stream,
+# so the host-to-device transfer overlaps with compute on the current batch
+class CUDAPrefetcher:
+    def __init__(self, loader, device):
+        """
+        loader: DataLoader yielding (images, labels) batches in pinned memory
+        device: target device; on CPU batches are passed through unchanged
+        """
+        self.loader = loader
+        self.device = device
+        self.stream = torch.cuda.Stream() if device.type == "cuda" else None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def _preload(self, loader_iter):
+        batch = next(loader_iter, None)
+        if batch is None:
+            return None
+        with torch.cuda.stream(self.stream):
+            return [t.to(self.device, non_blocking=True) for t in batch]
+
+    def __iter__(self):
+        if self.stream is None:
+            for images, labels in self.loader:
+                yield images.to(self.device), labels.to(self.device)
+            return
+
+        loader_iter = iter(self.loader)
+        next_batch = self._preload(loader_iter)
+        while next_batch is not None:
+            # Wait for the staged copy, then mark the tensors as used by the compute stream
+            current_stream = torch.cuda.current_stream()
+            current_stream.wait_stream(self.stream)
+            for t in next_batch:
+                t.record_stream(current_stream)
+            images, labels = next_batch
+            next_batch = self._preload(loader_iter)
+            yield images, labels
+
+# ----------------------------------------
+# Warms up the next epoch's DataLoader iterator (worker reset + first batch) in a background
+# thread, so it overlaps with the validation pass instead of stalling the next training loop
+class PrefetchThread:
+    def __init__(self, loader):
+        self.loader = loader
+        self.queue = queue.Queue(maxsize=1)
+        self.thread = None
+
+    def __len__(self):
+        return len(self.loader)
+
+    def _warm_up(self):
+        try:
+            loader_iter = iter(self.loader)
+            self.queue.put((loader_iter, next(loader_iter, None)))
+        except Exception as error:
+            # Hand the error to the consumer instead of leaving it blocked on the queue
+            self.queue.put(error)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._warm_up, daemon=True)
+            self.thread.start()
+
+    def __iter__(self):
+        self.start()  # No-op if already warmed up during the previous validation pass
+        item = self.queue.get()
+        self.thread = None
+        if isinstance(item, Exception):
+            raise item
+        loader_iter, first_batch = item
+        if first_batch is None:
+            return
+        yield first_batch
+        yield from loader_iter
+
+# ----------------------------------------
+# Iterates over a dataset cached entirely in device memory, using random index batches
+class DeviceBatchIterator:
+    def __init__(self, images, labels, batch_size, shuffle=False, drop_last=False):
+        """
+        images: tensor on the device, shape (N, 3, H, W), uint8
+        labels: tensor on the device, shape (N,), int64
+        """
+        self.images = images
+        self.labels = labels
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.labels) // self.batch_size
+        return (len(self.labels) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        num_samples = len(self.labels)
+        stop = num_samples - num_samples % self.batch_size if self.drop_last else num_samples
+        if self.shuffle:
+            perm = torch.randperm(num_samples, device=self.labels.device)
+            for i in range(0, stop, self.batch_size):
+                idx = perm[i:i+self.batch_size]
+                yield self.images[idx], self.labels[idx]
+        else:
+            for i in range(0, stop, self.batch_size):
+                yield self.images[i:i+self.batch_size], self.labels[i:i+self.batch_size]
+
+# ----------------------------------------
 # Each directory and its label (0: go, 1: left, 2: right)
 paths = [("/image/go", 0), ("/image/left", 1), ("/image/right", 2)]
+image_size = 64  # Images are saved already resized to the model input (64x64)
+
+# Collect all file paths first so the image array can be preallocated
+file_list = []
 for path, label in paths:
     for img_name in os.listdir(path):
-        img_path = os.path.join(path, img_name)
-        image = cv2.imread(img_path)  # Read image in BGR format
-        if image is None:
-            continue
-
-        # Convert BGR to RGB
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        image = image.astype('float32')
-
-        # Normalize pixel values from [0,255] to [-1,1]
-        image = (image / 127.5) - 1
-        data.append(image)
-        labels.append(label)
-data = np.array(data)
-labels = np.array(labels)
+        file_list.append((os.path.join(path, img_name), label))
+
+# Decode straight into the (N, 3, H, W) uint8 layout used by the model, so no later
+# list-to-array, transpose or dtype copies of the whole dataset are needed
+data = torch.empty((len(file_list), 3, image_size, image_size), dtype=torch.uint8)
+labels = torch.tensor([label for _, label in file_list], dtype=torch.long)
+
+def load_image(i):
+    image = cv2.imread(file_list[i][0])  # Read image in BGR format
+    if image is None:
+        return False
+
+    # Convert BGR to RGB, keep raw uint8 pixels (scaling is done by the transforms)
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    data[i] = torch.from_numpy(image).permute(2, 0, 1)
+    return True
+
+# OpenCV releases the GIL while decoding, so the images are decoded in parallel threads
+with ThreadPoolExecutor() as executor:
+    loaded = np.fromiter(executor.map(load_image, range(len(file_list))), dtype=bool, count=len(file_list))
+if not loaded.all():
+    # Drop unreadable files
+    loaded = torch.from_numpy(loaded)
+    data, labels = data[loaded], labels[loaded]
 print("Total number of images =", len(data))
 
 # ----------------------------------------
 # Split data into training and validation sets (8:2)
-X_train, X_valid, Y_train, Y_valid = train_test_split(data, labels, test_size=0.2, random_state=42)
-
-# ----------------------------------------
-# Data augmentation and preprocessing (using torchvision.transforms)
-# Apply augmentation and normalization to training data
-train_transform = transforms.Compose([
-    transforms.RandomRotation(20),          # Rotate up to 20 degrees
-    transforms.RandomAffine(degrees=0, translate=(0.05, 0.05)),  # Translation: up to 5% shift horizontally and vertically
-    transforms.RandomResizedCrop(64, scale=(0.9, 1.0)),
-    transforms.ToTensor(),                    # Convert to tensor ([0,1] range)
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],  # ImageNet mean
-                         std=[0.229, 0.224, 0.225])   # ImageNet standard deviation
-])
-# For validation data, apply only preprocessing without augmentation
-val_transform = transforms.Compose([
-    transforms.ToTensor(),
-    transforms.Normalize(mean=[0.485, 0.456, 0.406],
-                         std=[0.229, 0.224, 0.225])
-])
-
-train_dataset = CustomImageDataset(X_train, Y_train, transform=train_transform)
-val_dataset   = CustomImageDataset(X_valid, Y_valid, transform=val_transform)
-
-batch_size = 64
-train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=2)
-val_loader   = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=2)
+# Split indices (same permutation as splitting the arrays) and gather each subset once
+train_idx, valid_idx = train_test_split(np.arange(len(labels)), test_size=0.2, random_state=42)
+train_idx, valid_idx = torch.from_numpy(train_idx), torch.from_numpy(valid_idx)
+X_train, Y_train = data[train_idx], labels[train_idx]
+X_valid, Y_valid = data[valid_idx], labels[valid_idx]
+del data
+
+# ----------------------------------------
+# Data augmentation and preprocessing
+# The loaders return raw uint8 batches; the transforms run batched on the device after the copy,
+# with random parameters drawn per sample (see RandomAffineAugment)
+# ImageNet normalization is the first layer of the model (see Normalize)
+# Apply augmentation to training data
+train_transform = nn.Sequential(
+    v2.ToDtype(torch.float32, scale=True),  # Convert to float ([0,1] range)
+    RandomAffineAugment(degrees=20,         # Rotate up to 20 degrees
+                        translate=(0.05, 0.05),  # Translation: up to 5% shift horizontally and vertically
+                        scale=(0.9, 1.0)),  # RandomResizedCrop back to 64x64 from 90-100% of the area
+).to(device)
+# For validation data, only convert to float without augmentation
+val_transform = v2.ToDtype(torch.float32, scale=True)
+
+train_dataset = CustomImageDataset(X_train, Y_train)
+val_dataset   = CustomImageDataset(X_valid, Y_valid)
 
 # ----------------------------------------
 # Define model: Transfer Learning (ResNet-34 based) - modified for 64x64 input
@@ -119,13 +302,115 @@ model.fc = nn.Sequential(
     nn.Dropout(0.6),                 # Dropout (to prevent overfitting)
     nn.Linear(32, 3)                 # Final output: 3 classes
 )
-model = model.to(device)
+
+# channels_last (NHWC) lets cuDNN pick Tensor Core conv kernels without layout transposes
+model = model.to(device, memory_format=torch.channels_last)
+
+# `model` stays the bare ResNet, so best_model.pth keeps the plain ResNet-34 state_dict keys.
+# Training and evaluation run `net`, which prepends ImageNet normalization ([0,1] float input)
+normalize = Normalize(mean=[0.485, 0.456, 0.406],  # ImageNet mean
+                      std=[0.229, 0.224, 0.225])   # ImageNet standard deviation
+net = nn.Sequential(normalize, model).to(device)
+
+# Compile for kernel fusion (conv+bn+relu, elementwise ops, normalization into conv1); CUDA only,
+# like AMP and fused Adam (on CPU it needs a C++ toolchain and CUDA graphs do not apply)
+if device.type == "cuda":
+    compiled_model = torch.compile(net, mode='reduce-overhead', fullgraph=False)
+else:
+    compiled_model = net
+
+# ----------------------------------------
+# The dataset is small (64x64 uint8 images), so keep it resident on the GPU when it fits
+# comfortably; this removes the DataLoader, its workers and all per-step host-to-device copies.
+# It is uploaded before the batch size probe so the probe sees the memory it takes
+dataset_bytes = (X_train.nelement() + X_valid.nelement()) * X_train.element_size()
+cache_on_device = device.type == "cuda" and dataset_bytes < torch.cuda.mem_get_info()[0] // 4
+if cache_on_device:
+    X_train_device, Y_train_device = X_train.to(device), Y_train.to(device)
+    X_valid_device, Y_valid_device = X_valid.to(device), Y_valid.to(device)
+print("Dataset cached on device:", cache_on_device)
 
 # ----------------------------------------
-# Set Loss, Optimizer, and Scheduler
+# Set Loss, Optimizer, and Scheduler (the learning rate is set once the batch size is known)
 criterion = nn.CrossEntropyLoss()
-optimizer = optim.Adam(model.parameters(), lr=1e-3, weight_decay=1e-3)
+# Fused Adam updates all parameters in a single kernel (CUDA only)
+optimizer = optim.Adam(model.parameters(), lr=1e-3, weight_decay=1e-3, fused=device.type == "cuda")
 scheduler = ReduceLROnPlateau(optimizer, mode='min', factor=0.1, patience=4, verbose=True, min_lr=1e-6)
+scaler = torch.cuda.amp.GradScaler(enabled=use_amp)
+
+# ----------------------------------------
+# Batch size: with AMP and channels_last there is room for larger batches than the original 64,
+# so probe the candidates (largest first) and keep the first that fits. A candidate is only tried
+# if the train split holds at least min_batches_per_epoch full batches, so drop_last discards
+# at most a small fraction of the samples each epoch.
+# Each probe runs a full training step (forward, backward, GradScaler + fused Adam step, so the
+# optimizer moments are allocated) on a copy of the model, with the real model and the dataset
+# cache already resident. A candidate only fits if the peak allocation stays below memory_budget
+# of the device memory; the rest is headroom for the CUDA-graph pool of the compiled model
+def fits_in_memory(probe_batch_size, memory_budget, total_memory):
+    probe_model = copy.deepcopy(net).train()  # Probe a copy so weights and BatchNorm statistics stay untouched
+    probe_optimizer = optim.Adam(probe_model.parameters(), lr=1e-3, weight_decay=1e-3, fused=True)
+    probe_scaler = torch.cuda.amp.GradScaler(enabled=use_amp)
+    torch.cuda.reset_peak_memory_stats(device)
+    try:
+        images = torch.rand(probe_batch_size, 3, image_size, image_size, device=device)
+        images = images.contiguous(memory_format=torch.channels_last)
+        labels = torch.randint(0, 3, (probe_batch_size,), device=device)
+        with torch.cuda.amp.autocast(dtype=torch.float16, enabled=use_amp):
+            loss = criterion(probe_model(images), labels)
+        probe_scaler.scale(loss).backward()
+        probe_scaler.step(probe_optimizer)
+        probe_scaler.update()
+        torch.cuda.synchronize(device)
+        return torch.cuda.max_memory_allocated(device) < memory_budget * total_memory
+    except torch.cuda.OutOfMemoryError:
+        return False
+
+base_batch_size = 64
+batch_size = base_batch_size
+min_batches_per_epoch = 4
+if device.type == "cuda":
+    total_memory = torch.cuda.get_device_properties(device).total_memory
+    for candidate in (256, 128):
+        fits = (len(X_train) >= min_batches_per_epoch * candidate
+                and fits_in_memory(candidate, memory_budget=0.75, total_memory=total_memory))
+        torch.cuda.empty_cache()  # Release the probe copy, its optimizer state and activations
+        if fits:
+            batch_size = candidate
+            break
+print("Batch size:", batch_size)
+
+# Scale the learning rate with the square root of the batch size (1e-3 at batch size 64), the usual
+# rule for Adam; linear scaling would give 4e-3 at 256, close to the 5e-3 that the experiments
+# (README, models K-O) found worse than 1e-3. The largest candidate (256) gives 2e-3
+base_lr = 1e-3 * math.sqrt(batch_size / base_batch_size)
+print("Learning rate:", base_lr)
+for param_group in optimizer.param_groups:
+    param_group['lr'] = base_lr
+# Linear warmup to base_lr keeps early training stable at larger batch sizes; at the original
+# batch size the tuned 1e-3 schedule is kept unchanged
+warmup_epochs = 5 if batch_size > base_batch_size else 0
+
+# drop_last keeps the training batch shape fixed so the compiled model is not recompiled,
+# but a train split smaller than one batch keeps its partial batch instead of training on nothing
+drop_last = len(X_train) >= batch_size
+
+train_prefetch = None
+if cache_on_device:
+    train_batches = DeviceBatchIterator(X_train_device, Y_train_device, batch_size, shuffle=True,
+                                        drop_last=drop_last)
+    val_batches   = DeviceBatchIterator(X_valid_device, Y_valid_device, batch_size)
+else:
+    # Page-locked batches allow asynchronous (non_blocking) host-to-device copies
+    # Size the worker pool to the host; persistent workers are forked once instead of every epoch
+    num_workers = min(os.cpu_count() or 2, 8)
+    train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers,
+                              pin_memory=True, persistent_workers=True, prefetch_factor=4, drop_last=drop_last)
+    val_loader   = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers,
+                              pin_memory=True, persistent_workers=True, prefetch_factor=4)
+    train_prefetch = PrefetchThread(train_loader)
+    train_batches = CUDAPrefetcher(train_prefetch, device)
+    val_batches   = CUDAPrefetcher(val_loader, device)
 
 # ----------------------------------------
 # Training Loop with Early Stopping (based on validation loss)
@@ -133,6 +418,21 @@ num_epochs = 120
 best_val_loss = float('inf')
 patience = 30
 patience_counter = 0
+save_thread = None  # Background checkpoint writer
+save_errors = []    # Exceptions raised by the background checkpoint writer
+
+def save_checkpoint(state, path):
+    try:
+        torch.save(state, path)
+    except Exception as error:
+        save_errors.append(error)
+
+def wait_for_checkpoint():
+    # Join the writer and surface its error instead of silently keeping a stale/missing file
+    if save_thread is not None:
+        save_thread.join()
+    if save_errors:
+        raise RuntimeError("Saving best_model.pth failed") from save_errors[-1]
 
 train_losses = []
 val_losses = []
@@ -140,45 +440,62 @@ train_acc_list = []  # List to store train accuracy
 val_acc_list = []    # List to store validation accuracy
 
 for epoch in range(1, num_epochs+1):
+    if epoch <= warmup_epochs:
+        for param_group in optimizer.param_groups:
+            param_group['lr'] = base_lr * epoch / warmup_epochs
     model.train()
-    running_loss = 0.0
-    running_correct = 0
-
-    for images, labels in train_loader:
-        images, labels = images.to(device), labels.to(device)
-        optimizer.zero_grad()
-        outputs = model(images)
-        loss = criterion(outputs, labels)
-        loss.backward()
-        optimizer.step()
+    # Accumulate on the device; .item() is called once per epoch instead of syncing every batch
+    running_loss = torch.zeros((), device=device)
+    running_correct = torch.zeros((), device=device, dtype=torch.long)
+    running_total = 0
+
+    for images, labels in train_batches:
+        images = train_transform(images).contiguous(memory_format=torch.channels_last)
+        optimizer.zero_grad(set_to_none=True)
+        with torch.cuda.amp.autocast(dtype=torch.float16, enabled=use_amp):
+            outputs = compiled_model(images)
+            loss = criterion(outputs, labels)
+        scaler.scale(loss).backward()
+        scaler.step(optimizer)
+        scaler.update()
 
-        running_loss += loss.item() * images.size(0)
+        running_loss += loss.detach() * images.size(0)
         _, preds = torch.max(outputs, 1)
-        running_correct += (preds == labels).sum().item()
+        running_correct += (preds == labels).sum()
+        running_total += images.size(0)
 
-    train_loss = running_loss / len(train_dataset)
-    train_acc = running_correct / len(train_dataset)
+    # drop_last skips the partial batch, so average over the samples actually seen
+    train_loss = (running_loss / running_total).item()
+    train_acc = (running_correct / running_total).item()
     train_losses.append(train_loss)
     train_acc_list.append(train_acc)  # Save training accuracy
 
     model.eval()
-    val_running_loss = 0.0
-    val_running_correct = 0
-    with torch.no_grad():
-        for images, labels in val_loader:
-            images, labels = images.to(device), labels.to(device)
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            val_running_loss += loss.item() * images.size(0)
+    if train_prefetch is not None and epoch < num_epochs and patience_counter < patience - 1:
+        # Start the next epoch's training iterator while validation runs; skipped when this epoch
+        # may be the last one (final epoch, or early stopping can trigger after this validation),
+        # in which case the next training loop starts the iterator itself
+        train_prefetch.start()
+    val_running_loss = torch.zeros((), device=device)
+    val_running_correct = torch.zeros((), device=device, dtype=torch.long)
+    with torch.inference_mode():
+        for images, labels in val_batches:
+            images = val_transform(images).contiguous(memory_format=torch.channels_last)
+            with torch.cuda.amp.autocast(dtype=torch.float16, enabled=use_amp):
+                outputs = compiled_model(images)
+                loss = criterion(outputs, labels)
+            val_running_loss += loss * images.size(0)
             _, preds = torch.max(outputs, 1)
-            val_running_correct += (preds == labels).sum().item()
+            val_running_correct += (preds == labels).sum()
 
-    val_loss = val_running_loss / len(val_dataset)
-    val_acc = val_running_correct / len(val_dataset)
+    val_loss = (val_running_loss / len(val_dataset)).item()
+    val_acc = (val_running_correct / len(val_dataset)).item()
     val_losses.append(val_loss)
     val_acc_list.append(val_acc)  # Save validation accuracy
 
-    scheduler.step(val_loss)
+    if epoch >= warmup_epochs:
+        # The plateau scheduler takes over once warmup has reached base_lr
+        scheduler.step(val_loss)
     current_lr = optimizer.param_groups[0]['lr']
 
     print(f"Epoch {epoch}/{num_epochs} - Train Loss: {train_loss:.4f}, Train Acc: {train_acc:.4f} | "
@@ -187,8 +504,11 @@ for epoch in range(1, num_epochs+1):
     if val_loss < best_val_loss:
         best_val_loss = val_loss
         patience_counter = 0
-        best_model_wts = model.state_dict()
-        torch.save(best_model_wts, "best_model.pth")
+        # Snapshot the weights on CPU, then serialize them in a background thread
+        best_model_wts = {k: v.detach().to('cpu', copy=True) for k, v in model.state_dict().items()}
+        wait_for_checkpoint()  # Never let two writers touch the same file
+        save_thread = threading.Thread(target=save_checkpoint, args=(best_model_wts, "best_model.pth"), daemon=True)
+        save_thread.start()
     else:
         patience_counter += 1
         if patience_counter >= patience:
@@ -219,20 +539,32 @@ plt.show()
 
 # ----------------------------------------
 # Final evaluation: Load the saved best model and evaluate on the validation dataset
+wait_for_checkpoint()  # Make sure the last checkpoint is fully written
 model.load_state_dict(torch.load("best_model.pth"))
 model.eval()
-final_loss = 0.0
-final_correct = 0
+
+# Fuse the stem (conv1+bn1+relu) and the head (Linear+BatchNorm1d) on an inference-only copy,
+# so the training model keeps its live BatchNorm layers
+inference_model = copy.deepcopy(model).eval()
+torch.ao.quantization.fuse_modules(inference_model, [['conv1', 'bn1', 'relu'], ['fc.0', 'fc.1']], inplace=True)
+inference_model = nn.Sequential(normalize, inference_model).eval()
+
+# Script and freeze the model so BatchNorm/Dropout are folded into constants and conv+bn is fused;
+# the frozen graph runs in FP32 (no autocast) so the final metrics are not subject to FP16 rounding
+frozen_model = torch.jit.freeze(torch.jit.script(inference_model))
+frozen_model = torch.jit.optimize_for_inference(frozen_model)
+final_loss = torch.zeros((), device=device)
+final_correct = torch.zeros((), device=device, dtype=torch.long)
 final_total = 0
-with torch.no_grad():
-    for images, labels in val_loader:
-        images, labels = images.to(device), labels.to(device)
-        outputs = model(images)
+with torch.inference_mode():
+    for images, labels in val_batches:
+        images = val_transform(images).contiguous(memory_format=torch.channels_last)
+        outputs = frozen_model(images)
         loss = criterion(outputs, labels)
-        final_loss += loss.item() * images.size(0)
+        final_loss += loss * images.size(0)
         _, preds = torch.max(outputs, 1)
-        final_correct += (preds == labels).sum().item()
+        final_correct += (preds == labels).sum()
         final_total += labels.size(0)
-final_val_loss = final_loss / len(val_dataset)
-final_val_acc = final_correct / len(val_dataset)
+final_val_loss = (final_loss / len(val_dataset)).item()
+final_val_acc = (final_correct / len(val_dataset)).item()
 print(f"Final Val Loss: {final_val_loss:.4f} - Final Val Acc: {final_val_acc:.4f}")
\ No newline at end of file